@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict
+
+import redis
+import redis.asyncio
+
+
+REDIS_URL = "redis://localhost:6379/0"
+
+# Default lifetime of a cached response, in seconds
+CACHE_EXPIRE = 60
+
+redis_client = redis.asyncio.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+logger = logging.getLogger(__name__)
+
+# Loads currently running in this process, by cache key
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def make_key(namespace: str, endpoint: str, **params) -> str:
+    """
+    Build a cache key from the namespace generation and the non-None params, sorted so equivalent queries share an entry
+
+    Read the key before loading: a write clearing the namespace meanwhile bumps the generation,
+    so the stale result is stored under a key nobody reads anymore.
+    """
+    try:
+        generation = await redis_client.get(f"{namespace}:gen")
+    except redis.RedisError as exc:
+        logger.warning("Cache generation read failed for %s: %s", namespace, exc)
+        generation = None
+    parts = [f"{name}={value}" for name, value in sorted(params.items()) if value is not None]
+    return ":".join([namespace, (generation or b"0").decode(), endpoint, *parts])
+
+
+async def get(key: str):
+    """
+    Return the cached JSON for key, or None on a miss or when Redis is unavailable
+    """
+    try:
+        value = await redis_client.get(key)
+    except redis.RedisError as exc:
+        logger.warning("Cache read failed for %s: %s", key, exc)
+        return None
+    return value
+
+
+async def set(key: str, value: bytes, expire: int = CACHE_EXPIRE):
+    """
+    Store an already serialized JSON value under key for expire seconds
+    """
+    try:
+        await redis_client.set(key, value, ex=expire)
+    except redis.RedisError as exc:
+        logger.warning("Cache write failed for %s: %s", key, exc)
+
+
+async def clear(namespace: str):
+    """
+    Invalidate every cached entry of the namespace by bumping its generation, old entries expire on their own
+    """
+    # Later readers must not join loads that started before the write, even when Redis is down
+    for key in [key for key in _inflight if key.startswith(f"{namespace}:")]:
+        del _inflight[key]
+    try:
+        await redis_client.incr(f"{namespace}:gen")
+    except redis.RedisError as exc:
+        logger.warning("Cache clear failed for %s: %s", namespace, exc)
+
+
+async def single_flight(key: str, load: Callable[[], Awaitable]):
+    """
+    Run load once for concurrent callers of the same key, later callers wait for its result
+    """
+    future = _inflight.get(key)
+    while future is not None:
+        try:
+            # Shielded so a disconnecting waiter doesn't cancel the shared load
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Only the leader was cancelled: retry, the first waiter back leads a new load
+            if not future.cancelled():
+                raise
+        future = _inflight.get(key)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await load()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        # Mark the exception retrieved in case nobody else was waiting
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        # clear() may already have dropped it, or a newer load taken its place
+        if _inflight.get(key) is future:
+            del _inflight[key]
\ No newline at end of file
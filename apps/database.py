@@ -1,27 +1,35 @@
-from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./movies.db"
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./movies.db"
 
 # Create the database engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, echo=True)
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
 
-# Create a session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# SQLite only enforces foreign keys when enabled on each connection
+@event.listens_for(engine.sync_engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+# Create a session factory, objects stay loaded after commit since async sessions can't lazy load
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 # Base class for declarative models
 Base = declarative_base()
 
 
 # Dependency function to get a database session
-def get_db():
+async def get_db():
     """
     Get a database session
     """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+    async with SessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -1,7 +1,12 @@
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
+from .. import cache
 from ..database import get_db
 from . import schemas, models
 from apps.movies.schemas import Movie as MovieSchema
@@ -14,52 +19,68 @@ router = APIRouter(
 
 
 @router.get('/directors', response_model=List[schemas.Director])
-def get_directors(db: Session = Depends(get_db)):
-    directors = db.query(models.Director).all()
-    return directors
+async def get_directors(db: AsyncSession = Depends(get_db)):
+    # The list is unbounded, stream it from a server side cursor instead of building it in memory
+    query = select(models.Director.id, models.Director.name).execution_options(yield_per=1000)
+    result = await db.stream(query)
+
+    async def generate():
+        yield b"["
+        separator = b""
+        async for rows in result.mappings().partitions():
+            yield separator + b",".join(orjson.dumps(dict(row)) for row in rows)
+            separator = b","
+        yield b"]"
+
+    return StreamingResponse(generate(), media_type="application/json")
 
 
 @router.get('/directors/{director_id}', response_model=schemas.Director)
-def get_director(director_id: int, db: Session = Depends(get_db)):
-    director = db.query(models.Director).filter(models.Director.id == director_id).first()
+async def get_director(director_id: int, db: AsyncSession = Depends(get_db)):
+    director = await db.get(models.Director, director_id)
     if not director:
         raise HTTPException(status_code=404, detail="Director not found")
     return director
 
 
 @router.post('/directors', response_model=schemas.Director, status_code=status.HTTP_201_CREATED)
-def create_director(director: schemas.DirectorCreate, db: Session = Depends(get_db)):
+async def create_director(director: schemas.DirectorCreate, db: AsyncSession = Depends(get_db)):
     new_director = models.Director(name=director.name)
     db.add(new_director)
-    db.commit()
-    db.refresh(new_director)
+    await db.commit()
+    await db.refresh(new_director)
     return new_director
 
 
 @router.put('/directors/{director_id}', response_model=schemas.Director)
-def update_director(director_id: int, director_update: schemas.DirectorCreate, db: Session = Depends(get_db)):
-    db_director = db.query(models.Director).filter(models.Director.id == director_id).first()
+async def update_director(director_id: int, director_update: schemas.DirectorCreate, db: AsyncSession = Depends(get_db)):
+    db_director = await db.get(models.Director, director_id)
     if not db_director:
         raise HTTPException(status_code=404, detail="Director not found")
     db_director.name = director_update.name
-    db.commit()
-    db.refresh(db_director)
+    await db.commit()
+    # Cached movie responses embed the director
+    await cache.clear("movies")
+    await db.refresh(db_director)
     return db_director
 
 
 @router.delete('/directors/{director_id}', status_code=status.HTTP_204_NO_CONTENT)
-def delete_director(director_id: int, db: Session = Depends(get_db)):
-    db_director = db.query(models.Director).filter(models.Director.id == director_id).first()
+async def delete_director(director_id: int, db: AsyncSession = Depends(get_db)):
+    db_director = await db.get(models.Director, director_id)
     if not db_director:
         raise HTTPException(status_code=404, detail="Director not found")
-    db.delete(db_director)
-    db.commit()
+    await db.delete(db_director)
+    await db.commit()
+    await cache.clear("movies")
     return None
 
 
 @router.get('/directors/{director_id}/movies', response_model=List[MovieSchema])
-def get_director_movies(director_id: int, db: Session = Depends(get_db)):
-    if not db.query(models.Director).filter(models.Director.id == director_id).first():
+async def get_director_movies(director_id: int, db: AsyncSession = Depends(get_db)):
+    # SELECT EXISTS(...) avoids loading a Director just to check it
+    if not (await db.execute(select(exists().where(models.Director.id == director_id)))).scalar():
         raise HTTPException(status_code=404, detail="Director not found")
-    db_movies = db.query(MovieModel).filter(MovieModel.director_id == director_id).all()
+    query = select(MovieModel).where(MovieModel.director_id == director_id).options(selectinload(MovieModel.director))
+    db_movies = (await db.execute(query)).scalars().all()
     return db_movies
\ No newline at end of file
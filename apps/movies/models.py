@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Float
+from sqlalchemy import DDL, Column, ForeignKey, Integer, String, Float, Index, event
 from sqlalchemy.orm import relationship
 
 from apps.database import Base
@@ -6,6 +6,10 @@ from apps.database import Base
 
 class Movie(Base):
     __tablename__ = "movies"
+    __table_args__ = (
+        # Composite index for the year range + rating filters of get_movies
+        Index("ix_movies_year_rating", "year", "rating"),
+    )
 
     id = Column(Integer, primary_key=True,index=True)
     title = Column(String(80), nullable=False, index=True)
@@ -15,4 +19,21 @@ class Movie(Base):
     rating = Column(Float, index=True)
     runtime = Column(Integer, index=True)
 
-    director = relationship("Director", back_populates="movies")
\ No newline at end of file
+    # Routes must eager load the director, a lazy load here raises instead of querying per row
+    director = relationship("Director", back_populates="movies", lazy="raise")
+
+
+# Trigram index so title ILIKE '%...%' is index-backed on PostgreSQL
+title_trgm_index = Index(
+    "ix_movies_title_trgm",
+    Movie.title,
+    postgresql_using="gin",
+    postgresql_ops={"title": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
+# gin_trgm_ops is provided by the pg_trgm extension
+event.listen(
+    title_trgm_index,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
\ No newline at end of file
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import hashlib
+
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from typing import List
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import delete, insert, lambda_stmt, select, update
+from sqlalchemy.exc import IntegrityError
 
+from .. import cache
 from ..database import get_db
 from . import schemas, models
 
@@ -14,73 +20,160 @@ router = APIRouter(
 )
 
 
+# get_movies filter param -> criteria for its lambda_stmt, year range first so it drives the (year, rating) index.
+# The SQL is built and compiled once per combination of filters, values are only bound parameters.
+MOVIE_FILTERS = {
+    "min_year": lambda value: lambda stmt: stmt.where(models.Movie.year >= value),
+    "max_year": lambda value: lambda stmt: stmt.where(models.Movie.year <= value),
+    "rating": lambda value: lambda stmt: stmt.where(models.Movie.rating == value),
+    # value is the ILIKE pattern. Leading wildcard can't use a B-tree; on PostgreSQL it is served by ix_movies_title_trgm
+    "title": lambda value: lambda stmt: stmt.where(models.Movie.title.ilike(value)),
+}
+
+
+def dump_movie(db_movie: models.Movie) -> bytes:
+    """
+    Serialize an ORM movie, validating it once through the schema
+    """
+    return orjson.dumps(schemas.Movie.from_orm(db_movie).dict())
+
+
+def json_response(content) -> Response:
+    """
+    Wrap serialized JSON in a Response, FastAPI returns it as is without the response_model pass
+    """
+    return Response(content=content, media_type="application/json")
+
+
+def etag_response(content, if_none_match: str = None) -> Response:
+    """
+    Like json_response with an ETag of the content, or an empty 304 when the client already has it
+    """
+    etag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+    # If-None-Match uses weak comparison, W/ prefixes (e.g. added by gzipping proxies) don't count
+    tags = [tag.strip().removeprefix("W/") for tag in (if_none_match or "").split(",")]
+    if tags == ["*"] or etag in tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response = json_response(content)
+    response.headers["ETag"] = etag
+    return response
+
+
+# response_model only documents the movie routes, they build and return the JSON themselves
 @router.get('/movies', response_model=List[schemas.Movie])
-def get_movies( title: str=None,
-                rating: float=None,
-                min_year: int=None,
-                max_year: int=None,
-                db: Session = Depends(get_db)):
-    query = db.query(models.Movie)
-
-                    
-    if title:
-        query = query.filter(models.Movie.title.ilike(f"%{title}%"))
-    if rating is not None:
-        query = query.filter(or_(models.Movie.rating==rating, models.Movie.rating.like(f"{rating}")))
-    if min_year:
-        query = query.filter(models.Movie.year >= min_year)
-    if max_year:
-        query = query.filter(models.Movie.year <= max_year)
-    movies = query.all()
-    return movies
+async def get_movies( title: str=None,
+                      rating: float=None,
+                      min_year: int=None,
+                      max_year: int=None,
+                      limit: int = Query(50, ge=1, le=200),
+                      offset: int = Query(0, ge=0),
+                      after_id: int=None,
+                      db: AsyncSession = Depends(get_db)):
+    cache_key = await cache.make_key("movies", "list", title=title, rating=rating, min_year=min_year, max_year=max_year,
+                                     limit=limit, offset=offset, after_id=after_id)
+    cached_movies = await cache.get(cache_key)
+    if cached_movies is not None:
+        return json_response(cached_movies)
+
+    # Plain rows instead of ORM objects, the director comes from the same query
+    query = lambda_stmt(
+        lambda: select(models.Movie.__table__, DirectorModel.name.label("director_name")).join(DirectorModel)
+    )
+
+    # 0 years and an empty title are ignored like before, a 0 rating still filters
+    params = {
+        "min_year": min_year or None,
+        "max_year": max_year or None,
+        "rating": rating,
+        "title": f"%{title}%" if title else None,
+    }
+    for name, value in params.items():
+        if value is not None:
+            query += MOVIE_FILTERS[name](value)
+    # Keyset pagination on the primary key, avoids scanning past deep offsets
+    if after_id is not None:
+        query += lambda stmt: stmt.where(models.Movie.id > after_id)
+    query += lambda stmt: stmt.order_by(models.Movie.id).limit(limit).offset(offset)
+
+    async def load_movies():
+        movies = []
+        for row in (await db.execute(query)).mappings():
+            movie = dict(row)
+            movie["director"] = {"id": movie["director_id"], "name": movie.pop("director_name")}
+            movies.append(movie)
+        content = orjson.dumps(movies)
+        await cache.set(cache_key, content)
+        return content
+
+    # Identical concurrent requests share one database query
+    return json_response(await cache.single_flight(cache_key, load_movies))
 
 
 @router.get('/movies/{movie_id}', response_model=schemas.Movie)
-def get_movie(movie_id: int, db: Session = Depends(get_db)):
-    
-    db_movie = db.query(models.Movie).filter(models.Movie.id == movie_id).first()
+async def get_movie(movie_id: int, if_none_match: str = Header(None), db: AsyncSession = Depends(get_db)):
+    cache_key = await cache.make_key("movies", "detail", id=movie_id)
+    cached_movie = await cache.get(cache_key)
+    if cached_movie is not None:
+        return etag_response(cached_movie, if_none_match)
+
+    query = select(models.Movie).where(models.Movie.id == movie_id).options(joinedload(models.Movie.director))
+    db_movie = (await db.execute(query)).scalar_one_or_none()
     if not db_movie:
         raise HTTPException(status_code=404, detail="Movie not found")
-        
-    return db_movie
+
+    content = dump_movie(db_movie)
+    await cache.set(cache_key, content)
+    return etag_response(content, if_none_match)
 
 
 @router.post('/movies', response_model=schemas.Movie)
-def create_movie(movie: schemas.MovieCreate, db: Session = Depends(get_db)):
-    if not db.query(DirectorModel).filter(DirectorModel.id == movie.director_id).first():
-        raise HTTPException(status_code=400, detail="Invalid director_id")
-    db_movie = models.Movie(
-        title=movie.title,
-        year=movie.year,
-        rating=movie.rating,
-        runtime=movie.runtime,
-        genre=movie.genre,
-        director_id=movie.director_id
+async def create_movie(movie: schemas.MovieCreate, db: AsyncSession = Depends(get_db)):
+    # INSERT ... RETURNING instead of add, commit and refresh
+    query = (
+        insert(models.Movie)
+        .values(**movie.dict())
+        .returning(models.Movie)
+        .options(selectinload(models.Movie.director))
     )
-    
-    db.add(db_movie)
-    db.commit()
-    db.refresh(db_movie)
-    return db_movie
+    try:
+        db_movie = (await db.execute(query)).scalar_one()
+    except IntegrityError:
+        # The directors foreign key rejected director_id
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid director_id")
+    await db.commit()
+    await cache.clear("movies")
+    return json_response(dump_movie(db_movie))
 
 
 @router.put('/movies/{movie_id}', response_model=schemas.Movie)
-def update_movie(movie_id: int, movie_update: schemas.MovieCreate, db: Session = Depends(get_db)):
-    db_movie = db.query(models.Movie).filter(models.Movie.id == movie_id).first()
-    if not movie_id:
+async def update_movie(movie_id: int, movie_update: schemas.MovieCreate, db: AsyncSession = Depends(get_db)):
+    # Single UPDATE ... RETURNING instead of SELECT, UPDATE and refresh
+    query = (
+        update(models.Movie)
+        .where(models.Movie.id == movie_id)
+        .values(**movie_update.dict(exclude_unset=True))
+        .returning(models.Movie)
+        .options(selectinload(models.Movie.director))
+    )
+    try:
+        db_movie = (await db.execute(query)).scalar_one_or_none()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid director_id")
+    if not db_movie:
         raise HTTPException(status_code=404, detail="Movie not found")
-    for field, value in movie_update.dict(exclude_unset=True).items():
-        setattr(db_movie, field, value)
-    db.commit()
-    db.refresh(db_movie)
-    return db_movie
+    await db.commit()
+    await cache.clear("movies")
+    return json_response(dump_movie(db_movie))
 
 
 @router.delete('/movies/{movie_id}', status_code=status.HTTP_204_NO_CONTENT)
-def delete_movie(movie_id: int, db: Session = Depends(get_db)):
-    db_movie = db.query(models.Movie).filter(models.Movie.id == movie_id).first()
-    if not db_movie:
+async def delete_movie(movie_id: int, db: AsyncSession = Depends(get_db)):
+    query = delete(models.Movie).where(models.Movie.id == movie_id).execution_options(synchronize_session=False)
+    result = await db.execute(query)
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Movie not found")
-    db.delete(db_movie)
-    db.commit()
+    await db.commit()
+    await cache.clear("movies")
     return None
@@ -1,25 +1,27 @@
 import json
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from apps import cache
 from apps.directors.models import Director as DirectorModel
 from apps.movies.models import Movie as MovieModel
 
 
-def insert_movie_database(db: Session):
+async def insert_movie_database(db: AsyncSession):
 
     with open('movies.json') as f:
         data = json.load(f)
     
     for item in data:
         director_name = item['director']
-        director = db.query(DirectorModel).filter(DirectorModel.name == director_name).first()
+        director = (await db.execute(select(DirectorModel).where(DirectorModel.name == director_name))).scalars().first()
 
         if not director: 
             # Create a new director if not found in the database
             director = DirectorModel(name=director_name)
             db.add(director)
-            db.commit()
-            db.refresh(director)
+            await db.commit()
+            await db.refresh(director)
         
         # Extract genre, year, rating, and runtime from the item
         genre = item['genre'].split(',')[0].strip() if item['genre'] else None
@@ -28,13 +30,13 @@ def insert_movie_database(db: Session):
         runtime = int(item['runtime'].split()[0]) if 'runtime' in item else None
         
         # Check if a movie with the same attributes already exists
-        existing_movie = db.query(MovieModel).filter(
+        existing_movie = (await db.execute(select(MovieModel).where(
             MovieModel.title == item['title'],
             MovieModel.year == year,
             MovieModel.runtime == runtime,
             MovieModel.genre == genre,
             MovieModel.rating == rating
-        ).first()
+        ))).scalars().first()
 
         if not existing_movie:
             # Create a new movie if it doesn't exist
@@ -47,7 +49,8 @@ def insert_movie_database(db: Session):
                 director_id=director.id
             )
             db.add(movie)
-            db.commit()
-            db.refresh(movie)
+            await db.commit()
+            await db.refresh(movie)
 
+    await cache.clear("movies")
     return {"message": "Movies inserted successfully"}
\ No newline at end of file
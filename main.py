@@ -1,8 +1,8 @@
 import uvicorn
 from fastapi import FastAPI, Depends
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from imdb import insert_movie_database
 from apps.database import engine, get_db
@@ -16,7 +16,7 @@ from apps.movies.routes import router as movies_router
 from apps.directors.routes import router as directors_router
 
 
-app = FastAPI(title="BursaBilisimToplulugu - Rest API Example", version="1.0.0")
+app = FastAPI(title="BursaBilisimToplulugu - Rest API Example", version="1.0.0", default_response_class=ORJSONResponse)
 
 
 @app.exception_handler(RequestValidationError)
@@ -25,16 +25,20 @@ async def validation_exception_handler(request, exc):
 
 
 @app.on_event("startup")
-def startup():
-    # Create database tables on startup
-    directors_models.Base.metadata.create_all(bind=engine)
-    movies_models.Base.metadata.create_all(bind=engine)
+async def startup():
+    async with engine.begin() as conn:
+        # Create database tables on startup
+        await conn.run_sync(directors_models.Base.metadata.create_all)
+        await conn.run_sync(movies_models.Base.metadata.create_all)
+        # create_all skips existing tables, so add indexes missing from older databases
+        for index in movies_models.Movie.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
 
 
 @app.get("api/v1/imdb-database", tags=["IMDB"], summary="IMDB Database Initialization", description="This endpoint initializes the IMDB database.")
-async def root(db: Session = Depends(get_db)):
+async def root(db: AsyncSession = Depends(get_db)):
     # Endpoint to initialize the IMDB database
-    return insert_movie_database(db)
+    return await insert_movie_database(db)
 
 
 # Routes